@@ -3,6 +3,8 @@ import numpy as np
 from keras.models import load_model
 from music21 import converter, instrument, note, chord, stream
 import os
+import json
+from ngram_index import NgramIndex, describe_overlap
 import base64
 
 # Function to recursively get all MIDI files
@@ -40,6 +42,12 @@ def get_notes(selected_files):
     
     return notes
 
+# Function to load the vocabulary saved by model.py
+def load_vocabulary(file_path='music_generator_vocab.json'):
+    """Load the vocabulary the model's output classes are indexed by."""
+    with open(file_path) as f:
+        return json.load(f)
+
 # Function to generate notes
 def generate_notes(model, network_input, pitchnames, n_vocab, total_notes=500):
     """ Generate notes from the trained model """
@@ -104,10 +112,30 @@ def create_midi(prediction_output, file_path='output.mid'):
     except Exception as e:
         st.error(f"Error writing MIDI file: {e}")
 
+# Function to check the output for passages copied from the training data
+def check_overlap(prediction_output, index_dir, reject, max_copied_notes):
+    """ Report the longest copied passage; return False if the piece should be rejected """
+    if not os.path.isdir(index_dir):
+        st.warning(f"No overlap index found in '{index_dir}'. Build it with: python ngram_index.py build")
+        return True
+
+    report = NgramIndex(index_dir).check(prediction_output)
+    st.write(describe_overlap(report))
+    if reject and report.length > max_copied_notes:
+        st.error(f"Rejected: the piece copies more than {max_copied_notes} consecutive notes from the training data. Try generating again.")
+        return False
+    return True
+
 # Load model and data
 st.title("AI Music Generation")
 st.write("Generate music with an AI model trained on MIDI files.")
 
+# Overlap check against the training data
+overlap_index_dir = 'corpus_index'
+show_overlap = st.checkbox("Check for passages copied from the training data", value=os.path.isdir(overlap_index_dir))
+reject_overlap = st.checkbox("Reject pieces with heavy overlaps", value=False)
+max_copied_notes = st.slider("Longest copied passage allowed (notes)", 12, 200, 32)
+
 midi_files = get_all_midi_files('midi_songs')
 st.write(f"Found {len(midi_files)} MIDI files.")
 
@@ -144,30 +172,32 @@ else:
         if len(notes) <= sequence_length:
             st.error("Not enough notes to generate sequences. Please provide more MIDI files.")
         else:
-            n_vocab = len(set(notes))
-            
-            pitchnames = sorted(set(item for item in notes))
+            try:
+                model = load_model('music_generator_model.h5')  # Replace with your model path
+                pitchnames = load_vocabulary('music_generator_vocab.json')  # Saved next to the model by model.py
+            except Exception as e:
+                st.error(f"Error loading model: {e}")
+                st.stop()
+
+            n_vocab = len(pitchnames)
             note_to_int = dict((note, number) for number, note in enumerate(pitchnames))
-            
+            notes = [item for item in notes if item in note_to_int]
+
             network_input = []
             for i in range(0, len(notes) - sequence_length):
                 sequence_in = notes[i:i + sequence_length]
                 network_input.append([note_to_int[char] for char in sequence_in])
-            
+
             st.write(f"Number of sequences created: {len(network_input)}")
-            
+
+            # generate_notes normalizes by n_vocab itself
             n_patterns = len(network_input)
             network_input = np.reshape(network_input, (n_patterns, sequence_length, 1))
-            network_input = network_input / float(n_vocab)
-            
-            try:
-                model = load_model('music_generator_model.h5')  # Replace with your model path
-            except Exception as e:
-                st.error(f"Error loading model: {e}")
-                st.stop()
             
             total_notes_to_generate = 500  # Adjust as needed
             prediction_output = generate_notes(model, network_input, pitchnames, n_vocab, total_notes=total_notes_to_generate)
+            if show_overlap and prediction_output and not check_overlap(prediction_output, overlap_index_dir, reject_overlap, max_copied_notes):
+                prediction_output = []
             if prediction_output:
                 create_midi(prediction_output)
                 st.audio('output.mid', format='audio/midi')
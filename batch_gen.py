@@ -0,0 +1,174 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from gen import get_all_midi_files, get_notes, load_vocabulary, prepare_sequences, generate_checked_notes, create_midi
+from ngram_index import NgramIndex
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+# State loaded once per worker process
+worker = {}
+
+# Function to set up a worker process
+def init_worker(model_path, vocab_path, notes, sequence_length, threads, overlap_index_dir):
+    """Load the model, its vocabulary, seed sequences and overlap index once per worker process."""
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+    from keras.models import load_model
+
+    worker['model'] = load_model(model_path)
+    # The MIDI files only provide seed windows; tokens are decoded with the model's own vocabulary
+    vocabulary = load_vocabulary(vocab_path)
+    worker['network_input'], worker['pitchnames'], worker['n_vocab'] = prepare_sequences(notes, sequence_length, vocabulary)
+    worker['overlap_index'] = NgramIndex(overlap_index_dir) if overlap_index_dir else None
+
+# Function to generate and save one piece
+def render_piece(job):
+    """Generate the piece for one seed and write it to its shard directory."""
+    started = time.time()
+    rng = np.random.RandomState(job['seed'])
+    prediction_output, report, attempts = generate_checked_notes(
+        worker['model'], worker['network_input'], worker['pitchnames'], worker['n_vocab'],
+        total_notes=job['total_notes'], temperature=job['temperature'], rng=rng,
+        overlap_index=worker['overlap_index'], max_copied_notes=job['max_copied_notes'],
+        max_attempts=job['max_attempts'])
+    if prediction_output:
+        create_midi(prediction_output, file_path=os.path.basename(job['file']),
+                    output_folder=os.path.dirname(job['file']))
+    entry = dict(job, notes=len(prediction_output or []), attempts=attempts, seconds=round(time.time() - started, 3))
+    if report is not None:
+        entry.update(copied_notes=report.length, copied_from=report.song, copied_transposition=report.transposition,
+                     copied_lower_bound=report.lower_bound,
+                     rejected=prediction_output is None)
+    return entry
+
+# Function to read the finished pieces of an earlier run
+def load_manifest(manifest_path):
+    """Return the manifest entries already written, keyed by seed."""
+    done = {}
+    if not os.path.exists(manifest_path):
+        return done
+    with open(manifest_path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # line cut short when a previous run was killed
+            if entry.get('rejected') or (entry.get('notes') and os.path.exists(entry['file'])):
+                done[entry['seed']] = entry
+    return done
+
+def piece_path(output_dir, seed, shard_size):
+    """Sharded output path of the piece for a seed."""
+    return os.path.join(output_dir, f"{seed // shard_size:04d}", f"piece_{seed:07d}.mid")
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate many pieces in parallel with a resumable manifest.")
+    parser.add_argument('--count', type=int, required=True, help="Number of pieces to generate.")
+    parser.add_argument('--seed-start', type=int, default=0, help="First seed; pieces use seeds seed-start .. seed-start+count-1.")
+    parser.add_argument('--temperature', type=float, default=None, help="Sampling temperature; omit to always pick the most likely note.")
+    parser.add_argument('--total-notes', type=int, default=500)
+    parser.add_argument('--output-dir', default='output')
+    parser.add_argument('--shard-size', type=int, default=1000, help="Pieces per output subdirectory.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--threads-per-worker', type=int, default=1)
+    parser.add_argument('--model', default='music_generator_model.h5')
+    parser.add_argument('--vocab', default='music_generator_vocab.json', help="Vocabulary saved with the model by model.py.")
+    parser.add_argument('--midi-dir', default='midi_songs')
+    parser.add_argument('--max-files', type=int, default=10, help="Number of MIDI files used to seed generation.")
+    parser.add_argument('--sequence-length', type=int, default=100)
+    parser.add_argument('--overlap-index-dir', default='corpus_index', help="Built with: python ngram_index.py build")
+    parser.add_argument('--max-copied-notes', type=int, default=None,
+                        help="Reject pieces copying more consecutive notes than this from the training data; omit to only report.")
+    parser.add_argument('--max-attempts', type=int, default=5, help="Generation attempts per seed before recording it as rejected.")
+    args = parser.parse_args()
+
+    # Settings every piece in an output directory must share for a run to resume there
+    settings = {'model': os.path.abspath(args.model), 'vocab': os.path.abspath(args.vocab),
+                'midi_dir': os.path.abspath(args.midi_dir), 'max_files': args.max_files,
+                'sequence_length': args.sequence_length, 'temperature': args.temperature,
+                'total_notes': args.total_notes, 'max_copied_notes': args.max_copied_notes,
+                'max_attempts': args.max_attempts}
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = os.path.join(args.output_dir, MANIFEST_NAME)
+    done = load_manifest(manifest_path)
+    for entry in done.values():
+        changed = [name for name, value in settings.items() if entry.get(name) != value]
+        if changed:
+            print(f"{manifest_path} was written with different settings ({', '.join(changed)}). "
+                  f"Use a new --output-dir or rerun with the original settings.")
+            exit(1)
+
+    jobs = []
+    for seed in range(args.seed_start, args.seed_start + args.count):
+        if seed not in done:
+            jobs.append(dict(settings, seed=seed, file=piece_path(args.output_dir, seed, args.shard_size)))
+    print(f"{args.count - len(jobs)} of {args.count} pieces already done, {len(jobs)} to generate.")
+    if not jobs:
+        return
+
+    midi_files = get_all_midi_files(args.midi_dir)[:args.max_files]
+    notes = get_notes(midi_files)
+
+    # Check everything the workers load up front; a worker that fails to start would stop the whole run
+    if not os.path.isfile(args.model):
+        print(f"Error loading model: '{args.model}' not found.")
+        exit(1)
+    try:
+        vocabulary = load_vocabulary(args.vocab)
+    except Exception as e:
+        print(f"Error loading vocabulary '{args.vocab}': {e}")
+        exit(1)
+    network_input, _, _ = prepare_sequences(notes, args.sequence_length, vocabulary)
+    if len(network_input) == 0:
+        print("Not enough notes to generate sequences. Please provide more MIDI files.")
+        exit(1)
+
+    overlap_index_dir = args.overlap_index_dir if os.path.isdir(args.overlap_index_dir) else None
+    if overlap_index_dir is None and args.max_copied_notes is not None:
+        print(f"No overlap index found in '{args.overlap_index_dir}'. Build it with: python ngram_index.py build")
+        exit(1)
+    if overlap_index_dir is not None:
+        try:
+            NgramIndex(overlap_index_dir)
+        except Exception as e:
+            print(f"Error loading overlap index '{overlap_index_dir}': {e}")
+            exit(1)
+
+    # spawn keeps TensorFlow state out of the forked children
+    context = multiprocessing.get_context('spawn')
+    started = time.time()
+    finished = 0
+    with ProcessPoolExecutor(args.workers, mp_context=context, initializer=init_worker,
+                             initargs=(args.model, args.vocab, notes, args.sequence_length, args.threads_per_worker,
+                                       overlap_index_dir)) as executor, \
+            open(manifest_path, 'a') as manifest:
+        futures = [executor.submit(render_piece, job) for job in jobs]
+        try:
+            for future in as_completed(futures):
+                entry = future.result()
+                manifest.write(json.dumps(entry) + '\n')
+                manifest.flush()
+                finished += 1
+                if finished % 10 == 0 or finished == len(jobs):
+                    minutes = (time.time() - started) / 60
+                    print(f"{finished}/{len(jobs)} pieces, {finished / minutes:.1f} pieces/minute")
+        except BrokenProcessPool as e:
+            # Raised when a worker dies or its setup fails, e.g. an unreadable model file
+            print(f"Worker processes failed after {finished} pieces: {e}")
+            exit(1)
+
+    minutes = (time.time() - started) / 60
+    print(f"Generated {finished} pieces in {minutes:.1f} minutes ({finished / minutes:.1f} pieces/minute).")
+
+if __name__ == '__main__':
+    main()
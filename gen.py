@@ -2,6 +2,9 @@ import numpy as np
 from keras.models import load_model
 from music21 import converter, instrument, note, chord, stream
 import os
+import argparse
+import json
+from ngram_index import NgramIndex, OverlapMonitor, describe_overlap
 
 # Function to recursively get all MIDI files
 def get_all_midi_files(directory):
@@ -37,13 +40,18 @@ def get_notes(selected_files):
     return notes
 
 # Function to generate notes
-def generate_notes(model, network_input, pitchnames, n_vocab, total_notes=500):
-    """ Generate notes from the trained model """
+def generate_notes(model, network_input, pitchnames, n_vocab, total_notes=500, temperature=None, rng=np.random,
+                   overlap_monitor=None, max_copied_notes=None):
+    """ Generate notes from the trained model, sampling with temperature (None picks the most likely note)
+
+    Notes are fed to overlap_monitor as they are generated; generation stops and
+    returns None as soon as more than max_copied_notes consecutive notes are copied.
+    """
     if len(network_input) == 0:
         print("No input sequences available. Ensure your dataset has enough notes.")
         return []
 
-    start = np.random.randint(0, len(network_input) - 1)
+    start = rng.randint(0, len(network_input) - 1)
     int_to_note = dict((number, note) for number, note in enumerate(pitchnames))
 
     pattern = network_input[start]
@@ -55,19 +63,49 @@ def generate_notes(model, network_input, pitchnames, n_vocab, total_notes=500):
         
         prediction = model.predict(prediction_input, verbose=0)
         
-        index = np.argmax(prediction)
+        if temperature:
+            logits = np.log(np.maximum(prediction[0], 1e-12)) / temperature
+            probabilities = np.exp(logits - logits.max())
+            index = rng.choice(len(probabilities), p=probabilities / probabilities.sum())
+        else:
+            index = np.argmax(prediction)
         result = int_to_note.get(index)
         if result:
             prediction_output.append(result)
+            if overlap_monitor is not None:
+                report = overlap_monitor.update(result)
+                if max_copied_notes is not None and report.length > max_copied_notes:
+                    return None
         
         pattern = np.append(pattern, index)
         pattern = pattern[1:len(pattern)]
 
     return prediction_output
+
+# Function to generate notes that don't copy the training data
+def generate_checked_notes(model, network_input, pitchnames, n_vocab, total_notes=500, temperature=None, rng=np.random,
+                           overlap_index=None, max_copied_notes=None, max_attempts=5):
+    """ Generate notes, retrying while a piece copies more than max_copied_notes consecutive notes
+
+    Returns the notes (None if every attempt was rejected, [] if there was nothing
+    to generate from), the overlap report of the last attempt (None without an
+    overlap index) and the number of attempts made.
+    """
+    for attempt in range(1, max_attempts + 1):
+        overlap_monitor = OverlapMonitor(overlap_index) if overlap_index is not None else None
+        prediction_output = generate_notes(model, network_input, pitchnames, n_vocab, total_notes=total_notes,
+                                           temperature=temperature, rng=rng, overlap_monitor=overlap_monitor,
+                                           max_copied_notes=max_copied_notes)
+        report = overlap_monitor.best if overlap_monitor is not None else None
+        if prediction_output is not None:
+            return prediction_output, report, attempt
+        print(f"Rejected attempt {attempt}: {describe_overlap(report)}")
+    return None, report, max_attempts
+
 # Function to create MIDI file
-def create_midi(prediction_output, file_path='output.mid'):
+def create_midi(prediction_output, file_path='output.mid', output_folder='output'):
     """ Convert the output from the prediction to notes and create a midi file from the notes """
-    output_folder = 'path/to/save/output'  # Replace with your desired folder path
+    os.makedirs(output_folder, exist_ok=True)
     full_file_path = os.path.join(output_folder, file_path)
     
     offset = 0
@@ -99,42 +137,80 @@ def create_midi(prediction_output, file_path='output.mid'):
     except Exception as e:
         print(f"Error writing MIDI file: {e}")
 
-# Rest of your script remains unchanged...
+# Function to load the vocabulary saved by model.py
+def load_vocabulary(file_path='music_generator_vocab.json'):
+    """ Load the vocabulary the model's output classes are indexed by """
+    with open(file_path) as f:
+        return json.load(f)
 
-# Load model and data
-midi_files = get_all_midi_files('midi_songs')[:10]  # Use only the first ten MIDI files
-print(f"Using {len(midi_files)} MIDI files for generation.")
+# Function to prepare the seed sequences
+def prepare_sequences(notes, sequence_length=100, pitchnames=None):
+    """ Build the input sequences used to seed generation, as token ids of the model's vocabulary
 
-notes = get_notes(midi_files)
-print(f"Number of notes extracted: {len(notes)}")
-
-sequence_length = 100
-if len(notes) <= sequence_length:
-    print("Not enough notes to generate sequences. Please provide more MIDI files.")
-else:
-    n_vocab = len(set(notes))
-    
-    pitchnames = sorted(set(item for item in notes))
+    pitchnames should be the vocabulary saved with the model; it is only derived
+    from notes when none is given. Notes outside the vocabulary are skipped.
+    """
+    if pitchnames is None:
+        pitchnames = sorted(set(item for item in notes))
+    n_vocab = len(pitchnames)
     note_to_int = dict((note, number) for number, note in enumerate(pitchnames))
-    
+    notes = [item for item in notes if item in note_to_int]
+
     network_input = []
     for i in range(0, len(notes) - sequence_length):
         sequence_in = notes[i:i + sequence_length]
         network_input.append([note_to_int[char] for char in sequence_in])
-    
-    print(f"Number of sequences created: {len(network_input)}")
-    
+
+    # generate_notes normalizes by n_vocab itself
     n_patterns = len(network_input)
     network_input = np.reshape(network_input, (n_patterns, sequence_length, 1))
-    network_input = network_input / float(n_vocab)
-    
+    return network_input, pitchnames, n_vocab
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate one piece of music with the trained model.")
+    parser.add_argument('--overlap-index-dir', default='corpus_index', help="Built with: python ngram_index.py build")
+    parser.add_argument('--max-copied-notes', type=int, default=None,
+                        help="Reject pieces copying more consecutive notes than this from the training data; omit to only report.")
+    parser.add_argument('--max-attempts', type=int, default=5, help="Generation attempts before giving up on rejected pieces.")
+    args = parser.parse_args()
+
+    # Load model and data
+    midi_files = get_all_midi_files('midi_songs')[:10]  # Use only the first ten MIDI files
+    print(f"Using {len(midi_files)} MIDI files for generation.")
+
+    notes = get_notes(midi_files)
+    print(f"Number of notes extracted: {len(notes)}")
+
+    sequence_length = 100
+    if len(notes) <= sequence_length:
+        print("Not enough notes to generate sequences. Please provide more MIDI files.")
+        exit(1)
+
     try:
         model = load_model('music_generator_model.h5')  # Replace with your model path
+        vocabulary = load_vocabulary('music_generator_vocab.json')  # Saved next to the model by model.py
     except Exception as e:
         print(f"Error loading model: {e}")
         exit(1)
-    
+
+    network_input, pitchnames, n_vocab = prepare_sequences(notes, sequence_length, vocabulary)
+    print(f"Number of sequences created: {len(network_input)}")
+
     total_notes_to_generate = 500  # Adjust as needed
-    prediction_output = generate_notes(model, network_input, pitchnames, n_vocab, total_notes=total_notes_to_generate)
+    overlap_index = NgramIndex(args.overlap_index_dir) if os.path.isdir(args.overlap_index_dir) else None
+    if overlap_index is None and args.max_copied_notes is not None:
+        print(f"No overlap index found in '{args.overlap_index_dir}'. Build it with: python ngram_index.py build")
+        exit(1)
+
+    prediction_output, report, attempts = generate_checked_notes(
+        model, network_input, pitchnames, n_vocab, total_notes=total_notes_to_generate,
+        overlap_index=overlap_index, max_copied_notes=args.max_copied_notes, max_attempts=args.max_attempts)
+    if report is not None:
+        print(describe_overlap(report))
+
     if prediction_output:
         create_midi(prediction_output)
+    elif prediction_output is None:
+        print(f"No piece generated: all {attempts} attempts copied too much of the training data.")
+    else:
+        print("No piece generated.")
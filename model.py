@@ -1,9 +1,10 @@
 import numpy as np
 import os
-from music21 import converter, instrument, note, chord
+import json
+from music21 import converter, instrument, note, chord, pitch
 from keras.models import Sequential
 from keras.layers import Dense, Dropout, LSTM, Activation
-from tensorflow.keras.utils import to_categorical
+from tensorflow.keras.utils import to_categorical, Sequence
 
 def get_notes():
     """Extract notes and chords from MIDI files in the dataset."""
@@ -29,53 +30,126 @@ def get_notes():
                     print(f"Error parsing {file_path}: {e}")
     return notes
 
-# Extract notes
-notes = get_notes()
-print(f"Total notes extracted: {len(notes)}")
-
-# Prepare the sequences used by the Neural Network
-sequence_length = 100
-n_vocab = len(set(notes))
-print(f"Vocabulary size: {n_vocab}")
-
-pitchnames = sorted(set(item for item in notes))
-note_to_int = dict((note, number) for number, note in enumerate(pitchnames))
-
-network_input = []
-network_output = []
-
-for i in range(0, len(notes) - sequence_length):
-    sequence_in = notes[i:i + sequence_length]
-    sequence_out = notes[i + sequence_length]
-    network_input.append([note_to_int[char] for char in sequence_in])
-    network_output.append(note_to_int[sequence_out])
-
-print(f"Total patterns: {len(network_input)}")
-
-if len(network_output) == 0:
-    print("Error: No sequences were created. Check the sequence length and input notes.")
-    exit()
-
-n_patterns = len(network_input)
-network_input = np.reshape(network_input, (n_patterns, sequence_length, 1))
-network_input = network_input / float(n_vocab)
-network_output = to_categorical(network_output)
-
-# Build the LSTM network
-model = Sequential()
-model.add(LSTM(512, input_shape=(network_input.shape[1], network_input.shape[2]), return_sequences=True))
-model.add(Dropout(0.3))
-model.add(LSTM(512, return_sequences=True))
-model.add(Dropout(0.3))
-model.add(LSTM(512))
-model.add(Dense(256))
-model.add(Dropout(0.3))
-model.add(Dense(n_vocab))
-model.add(Activation('softmax'))
-model.compile(loss='categorical_crossentropy', optimizer='rmsprop')
-
-# Train the model
-model.fit(network_input, network_output, epochs=3, batch_size=64)
-
-# Save the model
-model.save('music_generator_model.h5')
+def transpose_token(token, semitones, midi_to_name):
+    """Transpose a note or chord token by a number of semitones."""
+    if ('.' in token) or token.isdigit():  # chord of pitch classes
+        pitch_classes = [(int(n) + semitones) % 12 for n in token.split('.')]
+        # Re-normalize so symmetric chords keep the token music21 itself would produce
+        return '.'.join(str(n) for n in chord.Chord(pitch_classes).normalOrder)
+    midi = pitch.Pitch(token).midi + semitones
+    # Reuse the spelling already in the corpus so e.g. D-4 and C#4 don't both appear
+    return midi_to_name.get(midi) or pitch.Pitch(midi=midi).nameWithOctave
+
+def build_transposition_table(pitchnames, semitone_shifts):
+    """Extend the vocabulary with every transposition of pitchnames.
+
+    Returns the extended vocabulary and a (len(semitone_shifts), len(pitchnames))
+    lookup table mapping each original token id to its transposed id in the
+    extended vocabulary.
+    """
+    midi_to_name = {}
+    for name in pitchnames:
+        if not (('.' in name) or name.isdigit()):
+            midi_to_name.setdefault(pitch.Pitch(name).midi, name)
+
+    transposed = [[transpose_token(token, shift, midi_to_name) for token in pitchnames] for shift in semitone_shifts]
+    vocabulary = sorted(set(pitchnames).union(*transposed))
+    note_to_int = dict((note, number) for number, note in enumerate(vocabulary))
+    table = np.array([[note_to_int[token] for token in row] for row in transposed], dtype=np.int32)
+    return vocabulary, table
+
+class TransposedSequences(Sequence):
+    """Training batches covering every corpus window in every key of the transposition table.
+
+    Only the corpus tokens and a shuffled order of (window, key) pairs are kept in
+    memory; windows are sliced and remapped through the transposition table when a
+    batch is requested.
+    """
+
+    def __init__(self, tokens, table, sequence_length, n_vocab, batch_size=64):
+        self.tokens = tokens
+        self.table = table
+        self.n_vocab = n_vocab
+        self.batch_size = batch_size
+        self.n_patterns = len(tokens) - sequence_length
+        self.n_samples = self.n_patterns * len(table)
+        self.window = np.arange(sequence_length + 1)
+        self.on_epoch_end()
+
+    def __len__(self):
+        return int(np.ceil(self.n_samples / self.batch_size))
+
+    def __getitem__(self, index):
+        samples = self.order[index * self.batch_size:(index + 1) * self.batch_size]
+        starts = samples // len(self.table)
+        shifts = samples % len(self.table)
+        windows = self.table[shifts[:, None], self.tokens[starts[:, None] + self.window]]
+        batch_input = windows[:, :-1, None] / float(self.n_vocab)
+        batch_output = to_categorical(windows[:, -1], num_classes=self.n_vocab)
+        return batch_input, batch_output
+
+    def on_epoch_end(self):
+        self.order = np.random.permutation(self.n_samples)
+
+def tokenize_notes(notes, augment_transpositions=True):
+    """Encode notes as an int32 token array and build the transposition table and vocabulary."""
+    semitone_shifts = range(-5, 7) if augment_transpositions else [0]  # all 12 keys
+
+    pitchnames = sorted(set(item for item in notes))
+    note_to_int = dict((note, number) for number, note in enumerate(pitchnames))
+    tokens = np.array([note_to_int[char] for char in notes], dtype=np.int32)
+
+    vocabulary, transposition_table = build_transposition_table(pitchnames, semitone_shifts)
+    return tokens, transposition_table, vocabulary
+
+def save_vocabulary(vocabulary, file_path='music_generator_vocab.json'):
+    """Save the vocabulary the model's output classes are indexed by."""
+    with open(file_path, 'w') as f:
+        json.dump(vocabulary, f)
+
+def build_model(sequence_length, n_vocab, lstm_units=512, lstm_layers=3, dropout=0.3, dense_units=256, optimizer='rmsprop'):
+    """Build and compile the LSTM network."""
+    model = Sequential()
+    model.add(LSTM(lstm_units, input_shape=(sequence_length, 1), return_sequences=lstm_layers > 1))
+    for layer in range(1, lstm_layers):
+        model.add(Dropout(dropout))
+        model.add(LSTM(lstm_units, return_sequences=layer < lstm_layers - 1))
+    model.add(Dense(dense_units))
+    model.add(Dropout(dropout))
+    model.add(Dense(n_vocab))
+    model.add(Activation('softmax'))
+    model.compile(loss='categorical_crossentropy', optimizer=optimizer)
+    return model
+
+if __name__ == '__main__':
+    # Extract notes
+    notes = get_notes()
+    print(f"Total notes extracted: {len(notes)}")
+
+    # Prepare the sequences used by the Neural Network
+    sequence_length = 100
+    augment_transpositions = True  # Train on all 12 keys of every song
+
+    tokens, transposition_table, vocabulary = tokenize_notes(notes, augment_transpositions)
+    n_vocab = len(vocabulary)
+    print(f"Vocabulary size: {n_vocab} ({transposition_table.shape[1]} before transposition)")
+
+    n_patterns = len(tokens) - sequence_length
+    print(f"Total patterns: {max(n_patterns, 0)} in {len(transposition_table)} keys "
+          f"({max(n_patterns, 0) * len(transposition_table)} per epoch)")
+
+    if n_patterns <= 0:
+        print("Error: No sequences were created. Check the sequence length and input notes.")
+        exit()
+
+    training_sequences = TransposedSequences(tokens, transposition_table, sequence_length, n_vocab, batch_size=64)
+
+    # Build the LSTM network
+    model = build_model(sequence_length, n_vocab)
+
+    # Train the model
+    model.fit(training_sequences, epochs=3)
+
+    # Save the model and the vocabulary generation has to decode its predictions with
+    model.save('music_generator_model.h5')
+    save_vocabulary(vocabulary, 'music_generator_vocab.json')
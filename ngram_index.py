@@ -0,0 +1,408 @@
+import argparse
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+from music21 import converter, instrument, note, chord, pitch
+
+HASH_BASE = 1000003
+HASH_MASK = (1 << 64) - 1
+DEFAULT_N = 12
+MAX_HITS_PER_GRAM = 256  # Very common n-grams (e.g. repeated notes) are only sampled
+INDEX_FORMAT = 2  # Bumped whenever the files written by build_index change
+# Generated notes are checked in all 12 keys, since model.py trains on every transposition
+TRANSPOSITIONS = range(-6, 6)
+
+# lower_bound is set when a longer copy could hide entirely inside sampled n-grams;
+# transposition is how many semitones the copy is shifted from the training song
+OverlapReport = namedtuple('OverlapReport', ['length', 'start', 'song', 'song_offset', 'lower_bound', 'transposition'])
+NO_OVERLAP = OverlapReport(0, None, None, None, False, 0)
+
+# Function to recursively get all MIDI files
+def get_all_midi_files(directory):
+    """Recursively get all MIDI files in a directory."""
+    midi_files = []
+    for root, _, files in os.walk(directory):
+        for file in files:
+            if file.endswith(".mid"):
+                midi_files.append(os.path.join(root, file))
+    return sorted(midi_files)
+
+# Function to load the notes of one song
+def get_song_notes(file_path):
+    """Extract notes and chords from a single MIDI file."""
+    notes = []
+    midi = converter.parse(file_path)
+    parts = instrument.partitionByInstrument(midi)
+    if parts:  # file has instrument parts
+        notes_to_parse = parts.parts[0].recurse()
+    else:
+        notes_to_parse = midi.flat.notes
+
+    for element in notes_to_parse:
+        if isinstance(element, note.Note):
+            notes.append(str(element.pitch))
+        elif isinstance(element, chord.Chord):
+            notes.append('.'.join(str(n) for n in element.normalOrder))
+    return notes
+
+def canonical_token(token, semitones=0):
+    """Spelling-independent form of a note or chord token, transposed by semitones.
+
+    Notes become their MIDI number (so C#4 and D-4 match) and chords their
+    normal order, e.g. 'n61' or '0.4.7'. Returns None for unparseable tokens.
+    """
+    try:
+        if ('.' in token) or token.isdigit():  # chord of pitch classes
+            pitch_classes = [(int(n) + semitones) % 12 for n in token.split('.')]
+            return '.'.join(str(n) for n in chord.Chord(pitch_classes).normalOrder)
+        return f"n{pitch.Pitch(token).midi + semitones}"
+    except Exception:
+        return None
+
+def window_hashes(tokens, n):
+    """Polynomial rolling hash (mod 2**64) of every length-n window of tokens."""
+    tokens = np.asarray(tokens, dtype=np.int64)
+    count = len(tokens) - n + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.uint64)
+
+    shifted = (tokens + 1).astype(np.uint64)
+    hashes = np.zeros(count, dtype=np.uint64)
+    for j in range(n):
+        hashes = hashes * np.uint64(HASH_BASE) + shifted[j:j + count]
+    return hashes
+
+def valid_windows(tokens, n):
+    """Mask of length-n windows that contain no unknown (-1) tokens."""
+    tokens = np.asarray(tokens)
+    count = len(tokens) - n + 1
+    if count <= 0:
+        return np.zeros(0, dtype=bool)
+
+    unknown = np.concatenate(([0], np.cumsum(tokens < 0)))
+    return (unknown[n:] - unknown[:count]) == 0
+
+# Function to build the index
+def build_index(midi_dir='midi_songs', index_dir='corpus_index', n=DEFAULT_N):
+    """Tokenize every song in midi_dir and write a memory-mappable n-gram index."""
+    songs = []
+    song_notes = []
+    for file_path in get_all_midi_files(midi_dir):
+        try:
+            notes = get_song_notes(file_path)
+        except Exception as e:
+            print(f"Error processing {file_path}: {e}")
+            continue
+        if len(notes) >= n:
+            songs.append(file_path)
+            song_notes.append(notes)
+
+    if not song_notes:
+        print(f"No songs with at least {n} notes found in '{midi_dir}'.")
+        return None
+
+    # Index canonical tokens so copies can be matched regardless of spelling and key
+    canonical = dict((item, canonical_token(item)) for notes in song_notes for item in notes)
+    pitchnames = sorted(set(token for token in canonical.values() if token is not None))
+    note_to_int = dict((note, number) for number, note in enumerate(pitchnames))
+
+    tokens = np.array([note_to_int.get(canonical[item], -1) for notes in song_notes for item in notes], dtype=np.int32)
+    song_starts = np.cumsum([0] + [len(notes) for notes in song_notes]).astype(np.int64)
+
+    # n-grams never cross song boundaries, so every hit belongs to exactly one song
+    hashes = []
+    positions = []
+    for start, end in zip(song_starts[:-1], song_starts[1:]):
+        hashes.append(window_hashes(tokens[start:end], n))
+        positions.append(np.arange(start, end - n + 1, dtype=np.int64))
+    hashes = np.concatenate(hashes)
+    positions = np.concatenate(positions)
+
+    order = np.argsort(hashes, kind='stable')
+
+    os.makedirs(index_dir, exist_ok=True)
+    np.save(os.path.join(index_dir, 'tokens.npy'), tokens)
+    np.save(os.path.join(index_dir, 'song_starts.npy'), song_starts)
+    np.save(os.path.join(index_dir, 'hashes.npy'), hashes[order])
+    np.save(os.path.join(index_dir, 'positions.npy'), positions[order])
+    with open(os.path.join(index_dir, 'meta.json'), 'w') as f:
+        json.dump({'format': INDEX_FORMAT, 'n': n, 'pitchnames': pitchnames, 'songs': songs}, f)
+
+    print(f"Indexed {len(hashes)} {n}-grams from {len(songs)} songs into {index_dir}")
+    return index_dir
+
+class NgramIndex:
+    """Memory-mapped n-gram index over the tokenized training corpus."""
+
+    def __init__(self, index_dir='corpus_index'):
+        with open(os.path.join(index_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('format') != INDEX_FORMAT:
+            raise ValueError(f"'{index_dir}' was built by an older version; rebuild it with: python ngram_index.py build")
+        self.n = meta['n']
+        self.pitchnames = meta['pitchnames']
+        self.songs = meta['songs']
+        self.note_to_int = dict((note, number) for number, note in enumerate(self.pitchnames))
+        self.token_ids = {}  # (note name, semitones) -> corpus token id
+
+        self.tokens = np.load(os.path.join(index_dir, 'tokens.npy'), mmap_mode='r')
+        self.song_starts = np.load(os.path.join(index_dir, 'song_starts.npy'), mmap_mode='r')
+        self.hashes = np.load(os.path.join(index_dir, 'hashes.npy'), mmap_mode='r')
+        self.positions = np.load(os.path.join(index_dir, 'positions.npy'), mmap_mode='r')
+
+    def token_id(self, note_name, semitones=0):
+        """Corpus token id of a note transposed by semitones, or -1 if the corpus never contains it."""
+        key = (note_name, semitones)
+        if key not in self.token_ids:
+            self.token_ids[key] = self.note_to_int.get(canonical_token(note_name, semitones), -1)
+        return self.token_ids[key]
+
+    def encode(self, notes, semitones=0):
+        """Map note names, transposed by semitones, to corpus token ids (-1 for unknown notes)."""
+        return np.array([self.token_id(item, semitones) for item in notes], dtype=np.int64)
+
+    def lookup(self, gram_hash):
+        """Corpus positions of the n-grams with the given hash (possibly collisions).
+
+        Returns the positions and whether they were cut off at MAX_HITS_PER_GRAM.
+        """
+        gram_hash = np.uint64(gram_hash)
+        lo = np.searchsorted(self.hashes, gram_hash, side='left')
+        hi = np.searchsorted(self.hashes, gram_hash, side='right')
+        return np.asarray(self.positions[lo:min(hi, lo + MAX_HITS_PER_GRAM)]), hi - lo > MAX_HITS_PER_GRAM
+
+    def song_bounds(self, corpus_positions):
+        """First and one-past-last corpus position of the songs containing corpus_positions."""
+        song_ids = np.searchsorted(self.song_starts, corpus_positions, side='right') - 1
+        return np.asarray(self.song_starts[song_ids]), np.asarray(self.song_starts[song_ids + 1])
+
+    def report(self, start, corpus_position, length, lower_bound=False, transposition=0):
+        """Build an OverlapReport for a copied span starting at corpus_position."""
+        song_id = int(np.searchsorted(self.song_starts, corpus_position, side='right')) - 1
+        song_offset = int(corpus_position - self.song_starts[song_id])
+        return OverlapReport(int(length), int(start), self.songs[song_id], song_offset, bool(lower_bound),
+                             int(transposition))
+
+    def extend_runs(self, tokens, starts, ends, diags):
+        """Grow copied spans [starts, ends) token by token while they still match the same song."""
+        starts = starts.copy()
+        ends = ends.copy()
+        song_start, song_end = self.song_bounds(starts + diags)
+
+        active = (starts > 0) & (starts - 1 + diags >= song_start)
+        while active.any():
+            runs = np.flatnonzero(active)
+            same = tokens[starts[runs] - 1] == self.tokens[starts[runs] - 1 + diags[runs]]
+            starts[runs[same]] -= 1
+            active[runs[~same]] = False
+            active &= (starts > 0) & (starts - 1 + diags >= song_start)
+
+        active = (ends < len(tokens)) & (ends + diags < song_end)
+        while active.any():
+            runs = np.flatnonzero(active)
+            same = tokens[ends[runs]] == self.tokens[ends[runs] + diags[runs]]
+            ends[runs[same]] += 1
+            active[runs[~same]] = False
+            active &= (ends < len(tokens)) & (ends + diags < song_end)
+        return starts, ends
+
+    def check(self, notes):
+        """Find the longest run of notes copied from a single training song, in any key."""
+        best = NO_OVERLAP
+        hidden_length = 0
+        for semitones in TRANSPOSITIONS:
+            report, hidden = self.check_key(self.encode(notes, semitones), -semitones)
+            hidden_length = max(hidden_length, hidden)
+            if report.length > best.length:
+                best = report
+        return best._replace(lower_bound=hidden_length > best.length)
+
+    def check_key(self, tokens, transposition=0):
+        """Longest copied run of already-encoded tokens in one key.
+
+        Returns the report and the length of the longest copy that could hide
+        entirely inside capped n-grams.
+        """
+        n = self.n
+        hashes = window_hashes(tokens, n)
+        if len(hashes) == 0:
+            return NO_OVERLAP, 0
+
+        lo = np.searchsorted(self.hashes, hashes, side='left')
+        hi = np.searchsorted(self.hashes, hashes, side='right')
+        valid = valid_windows(tokens, n)
+        capped = valid & (hi - lo > MAX_HITS_PER_GRAM)
+        counts = np.minimum(hi - lo, MAX_HITS_PER_GRAM) * valid
+        total = int(counts.sum())
+
+        # A copy lying entirely in capped n-grams may have been missed, so it bounds what we can vouch for
+        hidden = longest_true_run(capped)
+        hidden_length = hidden + n - 1 if hidden else 0
+        if total == 0:
+            return NO_OVERLAP, hidden_length
+
+        # One row per (generated n-gram, candidate corpus position)
+        gram_idx = np.repeat(np.arange(len(hashes)), counts)
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        corpus_pos = np.asarray(self.positions[np.repeat(lo, counts) + within])
+
+        # Drop hash collisions
+        window = np.arange(n)
+        match = (self.tokens[corpus_pos[:, None] + window] == tokens[gram_idx[:, None] + window]).all(axis=1)
+        gram_idx = gram_idx[match]
+        corpus_pos = corpus_pos[match]
+        if len(gram_idx) == 0:
+            return NO_OVERLAP, hidden_length
+
+        # A copied span shows up as consecutive n-grams on the same diagonal
+        diag = corpus_pos - gram_idx
+        order = np.lexsort((gram_idx, diag))
+        gram_idx = gram_idx[order]
+        diag = diag[order]
+        new_run = np.ones(len(gram_idx), dtype=bool)
+        new_run[1:] = (diag[1:] != diag[:-1]) | (gram_idx[1:] != gram_idx[:-1] + 1)
+        run_lengths = np.bincount(np.cumsum(new_run) - 1)
+
+        # Runs can stop early where an n-gram's hits were capped; follow the tokens instead
+        firsts = np.flatnonzero(new_run)
+        starts, ends = self.extend_runs(tokens, gram_idx[firsts], gram_idx[firsts] + run_lengths + n - 1, diag[firsts])
+
+        best = int(np.argmax(ends - starts))
+        length = ends[best] - starts[best]
+        return self.report(starts[best], starts[best] + diag[firsts][best], length, hidden_length > length,
+                           transposition), hidden_length
+
+def longest_true_run(mask):
+    """Length of the longest stretch of consecutive True values in mask."""
+    longest = 0
+    current = 0
+    for value in mask:
+        current = current + 1 if value else 0
+        longest = max(longest, current)
+    return longest
+
+class KeyMonitor:
+    """Track the longest span copied in one key incrementally while notes are being generated."""
+
+    def __init__(self, index, semitones=0):
+        self.index = index
+        self.semitones = semitones
+        self.tokens = []
+        self.known = 0  # length of the current stretch of notes the corpus contains
+        self.hash = 0
+        self.runs = {}  # diagonal (corpus position - note position) -> (start of the run, end of its song)
+        self.capped = 0
+        self.hidden_length = 0
+        self.best = NO_OVERLAP
+        self.top = pow(HASH_BASE, index.n - 1, 1 << 64)
+
+    def update(self, note_name):
+        """Add one generated note and return the longest copied span seen so far."""
+        n = self.index.n
+        corpus = self.index.tokens
+        token = self.index.token_id(note_name, self.semitones)
+        position = len(self.tokens)
+        self.tokens.append(token)
+
+        if token < 0:
+            self.known = 0
+            self.hash = 0
+            self.runs = {}
+            self.capped = 0
+            return self.best
+
+        if self.known == n:
+            self.hash = (self.hash - (self.tokens[position - n] + 1) * self.top) & HASH_MASK
+        else:
+            self.known += 1
+        self.hash = (self.hash * HASH_BASE + token + 1) & HASH_MASK
+        if self.known < n:
+            return self.best
+
+        # Tracked runs continue by comparing tokens, so capped lookups can't cut them short
+        runs = {}
+        for diag, (start, song_end) in self.runs.items():
+            if position + diag < song_end and corpus[position + diag] == token:
+                runs[diag] = (start, song_end)
+
+        gram_start = position - n + 1
+        gram = np.array(self.tokens[gram_start:])
+        positions, capped = self.index.lookup(self.hash)
+        for corpus_pos in positions:
+            diag = int(corpus_pos) - gram_start
+            if diag in runs or not np.array_equal(corpus[corpus_pos:corpus_pos + n], gram):
+                continue
+            # A new run may have started inside earlier capped n-grams; walk back to its real start
+            song_start, song_end = (int(bound) for bound in self.index.song_bounds(corpus_pos))
+            start = gram_start
+            while start > 0 and start - 1 + diag >= song_start and self.tokens[start - 1] == corpus[start - 1 + diag]:
+                start -= 1
+            runs[diag] = (start, song_end)
+        self.runs = runs
+
+        for diag, (start, song_end) in runs.items():
+            length = position + 1 - start
+            if length > self.best.length:
+                self.best = self.index.report(start, diag + start, length, transposition=-self.semitones)
+
+        self.capped = self.capped + 1 if capped else 0
+        if self.capped:
+            self.hidden_length = max(self.hidden_length, self.capped + n - 1)
+        self.best = self.best._replace(lower_bound=self.hidden_length > self.best.length)
+        return self.best
+
+class OverlapMonitor:
+    """Track the longest copied span, in any key, incrementally while notes are being generated."""
+
+    def __init__(self, index):
+        self.keys = [KeyMonitor(index, semitones) for semitones in TRANSPOSITIONS]
+        self.best = NO_OVERLAP
+
+    def update(self, note_name):
+        """Add one generated note and return the longest copied span seen so far."""
+        best = NO_OVERLAP
+        for key in self.keys:
+            report = key.update(note_name)
+            if report.length > best.length:
+                best = report
+        hidden_length = max(key.hidden_length for key in self.keys)
+        self.best = best._replace(lower_bound=hidden_length > best.length)
+        return self.best
+
+    def extend(self, notes):
+        """Add several generated notes and return the longest copied span seen so far."""
+        for note_name in notes:
+            self.update(note_name)
+        return self.best
+
+def describe_overlap(report):
+    """Human-readable summary of an OverlapReport."""
+    at_least = "at least " if report.lower_bound else ""
+    if report.length == 0:
+        if report.lower_bound:
+            return "No copied passages found, but some common patterns were only sampled."
+        return "No passages copied from the training data."
+    transposed = f", transposed {report.transposition:+d} semitones" if report.transposition else ""
+    return (f"Longest copied passage: {at_least}{report.length} notes starting at note {report.start}, "
+            f"from {report.song} (note {report.song_offset}){transposed}.")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build or query the n-gram overlap index of the training corpus.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="Build the index from a folder of MIDI files.")
+    build_parser.add_argument('--midi-dir', default='midi_songs')
+    build_parser.add_argument('--index-dir', default='corpus_index')
+    build_parser.add_argument('-n', type=int, default=DEFAULT_N, help="n-gram length in notes.")
+
+    check_parser = subparsers.add_parser('check', help="Report the longest passage a MIDI file copies from the corpus.")
+    check_parser.add_argument('midi_file')
+    check_parser.add_argument('--index-dir', default='corpus_index')
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        build_index(args.midi_dir, args.index_dir, args.n)
+    else:
+        print(describe_overlap(NgramIndex(args.index_dir).check(get_song_notes(args.midi_file))))
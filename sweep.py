@@ -0,0 +1,180 @@
+import argparse
+import csv
+import gc
+import itertools
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+from keras import backend
+
+from model import get_notes, tokenize_notes, build_model, TransposedSequences
+
+# Defaults match the architecture trained by model.py
+DEFAULT_PARAMS = {
+    'sequence_length': 100,
+    'lstm_units': 512,
+    'lstm_layers': 3,
+    'dropout': 0.3,
+    'dense_units': 256,
+    'optimizer': 'rmsprop',
+    'batch_size': 64,
+    'epochs': 3,
+}
+RESULT_FIELDS = ['trial'] + list(DEFAULT_PARAMS) + ['final_loss', 'min_loss', 'seconds', 'samples_per_second', 'error']
+
+# Shared corpus attached once per trial process
+corpus = {}
+
+def share_array(array):
+    """Copy an array into a new shared memory block and return the block."""
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block
+
+def attach_array(spec):
+    """View an array shared with share_array without copying it."""
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    corpus.setdefault('blocks', []).append(block)  # keep the mapping alive while the view is used
+    return np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+# Function to set up a trial process
+def init_trial_process(tokens_spec, table_spec, n_vocab, threads):
+    """Attach the shared corpus and bound TensorFlow's thread pools."""
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+
+    corpus['tokens'] = attach_array(tokens_spec)
+    corpus['table'] = attach_array(table_spec)
+    corpus['n_vocab'] = n_vocab
+
+# Function to train one configuration
+def run_trial(trial, params, steps_per_epoch=None):
+    """Train one hyperparameter configuration and return its row for the results table."""
+    result = dict(params, trial=trial)
+    # Worker processes are reused across trials; start each one from a clean Keras state
+    backend.clear_session()
+    model = history = None
+    try:
+        sequences = TransposedSequences(corpus['tokens'], corpus['table'], params['sequence_length'],
+                                        corpus['n_vocab'], batch_size=params['batch_size'])
+        model = build_model(params['sequence_length'], corpus['n_vocab'], lstm_units=params['lstm_units'],
+                            lstm_layers=params['lstm_layers'], dropout=params['dropout'],
+                            dense_units=params['dense_units'], optimizer=params['optimizer'])
+
+        started = time.time()
+        history = model.fit(sequences, epochs=params['epochs'], steps_per_epoch=steps_per_epoch, verbose=0)
+        seconds = time.time() - started
+
+        steps = steps_per_epoch or len(sequences)
+        samples = min(steps * params['batch_size'], sequences.n_samples) * params['epochs']
+        losses = history.history['loss']
+        result.update(final_loss=round(losses[-1], 5), min_loss=round(min(losses), 5),
+                      seconds=round(seconds, 1), samples_per_second=round(samples / seconds, 1))
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        del model, history
+        gc.collect()
+    return result
+
+def parse_value(value):
+    """Read a search space value as int, float or string."""
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+def search_space(param_args):
+    """Turn 'name=v1,v2,...' arguments into a dict of candidate values."""
+    space = {}
+    for arg in param_args:
+        name, _, values = arg.partition('=')
+        if name not in DEFAULT_PARAMS:
+            raise ValueError(f"Unknown hyperparameter '{name}'. Choose from: {', '.join(DEFAULT_PARAMS)}")
+        space[name] = [parse_value(value) for value in values.split(',')]
+    return space
+
+def trial_configs(space, random_trials=None, seed=0):
+    """Every combination of the search space, or random_trials random draws from it."""
+    names = list(space)
+    if random_trials:
+        rng = random.Random(seed)
+        combos = [[rng.choice(space[name]) for name in names] for _ in range(random_trials)]
+    else:
+        combos = itertools.product(*(space[name] for name in names))
+    return [dict(DEFAULT_PARAMS, **dict(zip(names, combo))) for combo in combos]
+
+def next_trial_id(results_path):
+    """First trial id not yet used in an existing results table."""
+    if not os.path.exists(results_path):
+        return 0
+    with open(results_path, newline='') as f:
+        trials = [int(row['trial']) for row in csv.DictReader(f) if row.get('trial', '').isdigit()]
+    return max(trials) + 1 if trials else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a hyperparameter sweep over the LSTM model on one shared corpus.")
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=V1,V2',
+                        help=f"Candidate values for a hyperparameter ({', '.join(DEFAULT_PARAMS)}). Repeat for each one.")
+    parser.add_argument('--random', type=int, default=None, metavar='N', help="Sample N random configurations instead of the full grid.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for random search.")
+    parser.add_argument('--parallel', type=int, default=2, help="Trials running at the same time.")
+    parser.add_argument('--threads-per-trial', type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument('--steps-per-epoch', type=int, default=None, help="Limit each epoch to this many batches.")
+    parser.add_argument('--no-transpose', action='store_true', help="Train without key-transposition augmentation.")
+    parser.add_argument('--results', default='sweep_results.csv')
+    args = parser.parse_args()
+
+    configs = trial_configs(search_space(args.param), args.random, args.seed)
+    print(f"Running {len(configs)} trials, {args.parallel} at a time.")
+
+    # Parse the corpus once; trials only read it from shared memory
+    notes = get_notes()
+    tokens, transposition_table, vocabulary = tokenize_notes(notes, augment_transpositions=not args.no_transpose)
+    print(f"Total notes extracted: {len(notes)}, vocabulary size: {len(vocabulary)}")
+
+    tokens_block = share_array(tokens)
+    table_block = share_array(transposition_table)
+    try:
+        initargs = ((tokens_block.name, tokens.shape, tokens.dtype),
+                    (table_block.name, transposition_table.shape, transposition_table.dtype),
+                    len(vocabulary), args.threads_per_trial)
+        # Continue numbering so rows from earlier sweeps in the same file stay distinct
+        first_trial = next_trial_id(args.results)
+        new_file = not os.path.exists(args.results)
+        with ProcessPoolExecutor(args.parallel, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_trial_process, initargs=initargs) as executor, \
+                open(args.results, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            if new_file:
+                writer.writeheader()
+            futures = [executor.submit(run_trial, trial, params, args.steps_per_epoch)
+                       for trial, params in enumerate(configs, start=first_trial)]
+            for future in as_completed(futures):
+                result = future.result()
+                writer.writerow(result)
+                f.flush()
+                if result.get('error'):
+                    print(f"Trial {result['trial']} failed: {result['error']}")
+                else:
+                    print(f"Trial {result['trial']}: loss {result['final_loss']}, "
+                          f"{result['samples_per_second']} samples/s in {result['seconds']}s")
+    finally:
+        tokens_block.close()
+        tokens_block.unlink()
+        table_block.close()
+        table_block.unlink()
+
+    print(f"Results written to {args.results}")
+
+if __name__ == '__main__':
+    main()